@@ -4,21 +4,19 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from core.routers.health import router as health_router
 from core.routers.avatar import router as avatar_router
 from core.flows import prepare_models_flow
+from core.steps.modules.utilities import close_clients
 from utils import setup_logger
 from settings import settings
-from models.errors import S3ListError, S3DownloadError, UnzipError, DataValidationError, CudaError
 from utils import (http_exception_handler,
                    validation_exception_handler,
                    generic_exception_handler,
-                   s3_download_exception_handler,
-                   unzip_exception_handler,
-                   s3_list_exception_handler,
-                   data_build_exception_handler,
                    runtime_exception_handler,
-                   cuda_exception_handler)
+                   domain_exception_handler,
+                   DOMAIN_EXCEPTIONS)
 
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
@@ -28,7 +26,7 @@ logger = setup_logger(name="avatar")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     try:
-        app.state.models = prepare_models_flow()
+        app.state.models = await prepare_models_flow()
         logger.info("App initialization completed.")
         yield
     except Exception as e:
@@ -37,12 +35,20 @@ async def lifespan(app: FastAPI):
     finally:
         try:
             logger.info("Application is shutting down...")
+            for model in app.state.models:
+                model.close()
             del app.state.models  # clean up models
         except Exception as e:
             logger.error(f"Error: exception during shutdown: {e}")
+        finally:
+            # S3 clients are opened by model downloads, even if startup failed afterwards
+            try:
+                await close_clients()
+            except Exception as e:
+                logger.error(f"Error: exception while closing S3 clients: {e}")
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -59,14 +65,13 @@ app.include_router(avatar_router, prefix=settings.BASE_PREFIX)
 app.add_exception_handler(HTTPException, http_exception_handler)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(Exception, generic_exception_handler)
-app.add_exception_handler(S3DownloadError, s3_download_exception_handler)
-app.add_exception_handler(UnzipError, unzip_exception_handler)
-app.add_exception_handler(S3ListError, s3_list_exception_handler)
-app.add_exception_handler(DataValidationError, data_build_exception_handler)
 app.add_exception_handler(RuntimeError, runtime_exception_handler)
-app.add_exception_handler(CudaError, cuda_exception_handler)
+for exc_class in DOMAIN_EXCEPTIONS:
+    app.add_exception_handler(exc_class, domain_exception_handler)
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    # Single worker process: models and CUDA context are loaded once and shared via app.state.
+    # Scale out with more instances, not `--workers`, which duplicates them per process.
+    uvicorn.run(app, host="0.0.0.0", port=8080, workers=1, loop="uvloop", http="httptools")
\ No newline at end of file
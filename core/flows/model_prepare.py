@@ -1,19 +1,30 @@
+import asyncio
+
 from typing import Tuple
 
-from prefect import flow
+from prefect import flow, get_run_logger
 
 from core.steps.modules import LandmarkModule, VAEModule
 
 
 @flow
-def prepare_models_flow() -> Tuple[LandmarkModule, VAEModule]:  
+async def prepare_models_flow() -> Tuple[LandmarkModule, VAEModule]:
     # Landmark model
     # TODO: make device configurable
     landmark_module = LandmarkModule(model_name='mmpose', device='cuda:0')
-    landmark_module.load_model()
 
     # VAE model
     vae_module = VAEModule(model_name='madebyollin/taesd', device='cuda:0')
-    vae_module.load_model()
+
+    # Download and load all models before the app starts serving requests
+    modules = (landmark_module, vae_module)
+    results = await asyncio.gather(*[module.warmup() for module in modules], return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        # the app never receives the modules, release the threads of those already created
+        for module in modules:
+            module.close()
+        raise errors[0]
+    get_run_logger().info(f"Models loaded: {landmark_module.model_name}, {vae_module.model_name}")
 
     return landmark_module, vae_module
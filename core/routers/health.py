@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
 from utils import setup_logger
 
@@ -8,6 +8,6 @@ router = APIRouter(prefix="/health", tags=["health"])
 logger = setup_logger(name="avatar.health")
 
 
-@router.get('/ready', response_class=JSONResponse)
+@router.get('/ready', response_class=ORJSONResponse)
 async def ready():
-    return JSONResponse({'status': 'OK'}, headers={'Access-Control-Allow-Origin': '*'})
+    return ORJSONResponse({'status': 'OK'}, headers={'Access-Control-Allow-Origin': '*'})
@@ -1,23 +1,36 @@
 import asyncio
+import functools
+import uvloop
 
-from typing import Dict, Any
-from prefect import task
-from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+from threading import Thread
 from pathlib import Path
 
 from utils import setup_logger
 from core.steps.modules.utilities.s3_module import S3Module, S3DownloadParams
-from settings import settings
+from settings import AWS_REGION, MODELS_S3_BUCKET_NAME, MODELS_S3_OBJECT_BASE_NAME, CONCURRENT_PER_MODEL
+
+
+def _start_infer_loop() -> asyncio.AbstractEventLoop:
+    """Start a persistent uvloop event loop in a daemon thread for the sync interface"""
+    loop = uvloop.new_event_loop()
+    Thread(target=loop.run_forever, name="infer-loop", daemon=True).start()
+    return loop
+
+
+# shared by every `process` call instead of creating a new loop per call
+_INFER_LOOP = _start_infer_loop()
 
 
 class BaseModelModule:
-    @task
-    def __init__(self, model_name: str, device: str, concurrent_per_model: int = 4, version: str = 'latest'):
+    def __init__(self, model_name: str, device: str, concurrent_per_model: Optional[int] = None, version: str = 'latest'):
         """
         Args:
             model_name (str): The name of the model.
             device (str): The device to load model on (e.g. 'cuda:0', 'cpu').
-            concurrent_per_model (int): The maximum number of concurrent tasks per model.
+            concurrent_per_model (Optional[int]): The maximum number of concurrent tasks per model.
+                Defaults to the CONCURRENT_PER_MODEL setting, or a device dependent value.
             version (str): Model version to use. Can be 'latest' or a version number.
         """
         self.model_name = model_name
@@ -34,25 +47,31 @@ class BaseModelModule:
         self.local_model_dir = Path("/app/models")
         self.local_model_dir.mkdir(parents=True, exist_ok=True)
         self.local_model_checkpoint_path = None
-        
-        # Download model files on initialization
-        asyncio.create_task(self._init_model_files())
 
-    @task
+    async def warmup(self) -> None:
+        """Download model files and load model, so it is ready before serving requests"""
+        await self._init_model_files()
+        await self.load_model()
+
     async def load_model(self, **kwargs):
         """Load model instance on specified device."""
+        if self.concurrent_per_model is None:
+            # Inference on CPU must be serialized, torch already parallelizes each op across all cores,
+            # concurrent calls only add thread contention. On GPU a few overlap kernel launches and copies.
+            self.concurrent_per_model = CONCURRENT_PER_MODEL or (1 if self.device.startswith('cpu') else 4)
+
         model = await self._load_model_on_device(self.device, self.local_model_checkpoint_path, **kwargs)
         if model:
             self.model_info = {
                 'model': model,
-                'concurrent_count': 0,
-                'lock': Lock(),
-                'sem': asyncio.Semaphore(self.concurrent_per_model)
+                'sem': asyncio.Semaphore(self.concurrent_per_model),
+                # dedicated inference threads, not shared with the default executor
+                'executor': ThreadPoolExecutor(max_workers=self.concurrent_per_model,
+                                               thread_name_prefix=f"{self.model_name}-infer")
             }
         else:
             raise RuntimeError("Model could not be loaded")
 
-    @task
     async def _load_model_on_device(self, device: str, local_model_checkpoint_path: str, **kwargs) -> Any:
         """
         Load a single model instance on specified device.
@@ -66,21 +85,24 @@ class BaseModelModule:
         """
         raise NotImplementedError("Subclass must implement _load_model_on_device method")
 
-    @task
     def forward(self, model: Any, **kwargs) -> Any:
         raise NotImplementedError("Subclass must implement forward method")
 
-    @task
     def _run_inference(self, model_info: Dict, **kwargs) -> Any:
         """Run inference in thread"""
-        try:
-            return self.forward(model_info['model'], **kwargs)
-        finally:
-            with model_info['lock']:
-                model_info['concurrent_count'] = max(0, model_info['concurrent_count'] - 1)
+        return self.forward(model_info['model'], **kwargs)
 
-    @task
     async def __call__(self, **kwargs) -> Any:
+        # The semaphore binds to the first loop waiting on it, so every inference
+        # goes through the shared inference loop, whichever loop awaits the model
+        if asyncio.get_running_loop() is not _INFER_LOOP:
+            return await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(self._infer(**kwargs), _INFER_LOOP)
+            )
+        return await self._infer(**kwargs)
+
+    async def _infer(self, **kwargs) -> Any:
+        """Run inference under the model semaphore, on the shared inference loop"""
         # Check if model is loaded
         if not self.model_info:
             raise RuntimeError("No model loaded. Call load_model first.")
@@ -88,11 +110,10 @@ class BaseModelModule:
         try:
             # Use model-specific semaphore to control concurrency
             async with self.model_info['sem']:
-                # Run inference in a separate thread
-                result = await asyncio.to_thread(
-                    self._run_inference,
-                    self.model_info,
-                    **kwargs
+                # Run inference in a model inference thread
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self.model_info['executor'],
+                    functools.partial(self._run_inference, self.model_info, **kwargs)
                 )
                 
                 return result
@@ -101,12 +122,23 @@ class BaseModelModule:
             self.logger.error(f"Error during inference: {str(e)}")
             raise
 
-    @task
+    def close(self) -> None:
+        """Release inference threads, waiting for running inferences"""
+        if self.model_info:
+            self.model_info['executor'].shutdown(wait=True)
+
     def process(self, **kwargs):
-        """Sync interface"""
-        return asyncio.run(self.__call__(**kwargs))
+        """
+        Sync interface, runs on the shared inference loop.
+        Blocks until the result is ready, so it must not be called from an event loop thread,
+        async callers await the module instead.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run_coroutine_threadsafe(self._infer(**kwargs), _INFER_LOOP).result()
+        raise RuntimeError("process() must not be called from an event loop, await the module instead")
 
-    @task
     async def download_model(self, s3_params: S3DownloadParams, version: str = 'latest') -> str:
         """
         Download model file from S3.
@@ -121,10 +153,11 @@ class BaseModelModule:
         s3_module = S3Module(s3_params=s3_params)
         
         # Download model file based on version
+        # Model checkpoints are large, fetch them with concurrent ranged requests
         if version == 'latest':
-            local_path = await s3_module.download_latest(self.model_name)
+            local_path = await s3_module.download_latest(self.model_name, multipart=True)
         else:
-            local_path = await s3_module.download_version(self.model_name, version)
+            local_path = await s3_module.download_version(self.model_name, version, multipart=True)
         
         if not local_path:
             raise ValueError(f"No model file found for {self.model_name} version {version}")
@@ -136,16 +169,15 @@ class BaseModelModule:
         
         return local_path
 
-    @task
     async def _init_model_files(self) -> None:
         """Initialize model file by downloading from S3"""
         model_name_lower = self.model_name.lower()
         version_prefix = "latest" if self.version == "latest" else f"v{self.version}"
         
         s3_params = S3DownloadParams(
-            s3_bucket=settings.MODELS_S3_BUCKET_NAME,
-            s3_base_object_path=f"{settings.MODELS_S3_OBJECT_BASE_NAME}/{model_name_lower}/{version_prefix}",
-            s3_region=settings.AWS_REGION,
+            s3_bucket=MODELS_S3_BUCKET_NAME,
+            s3_base_object_path=f"{MODELS_S3_OBJECT_BASE_NAME}/{model_name_lower}/{version_prefix}",
+            s3_region=AWS_REGION,
             local_dir=str(self.local_model_dir / model_name_lower / version_prefix)
         )
         
@@ -1,10 +1,12 @@
 import asyncio
 import numpy as np
+import torch
 
-from typing import Any, List, Tuple
-from mmpose.apis import init_model, inference_topdown
-from mmpose.structures import merge_data_samples
-from prefect import task
+from typing import Any, List, Optional, Tuple
+from PIL import Image
+from mmengine.dataset import Compose, pseudo_collate
+from mmengine.registry import init_default_scope
+from mmpose.apis import init_model
 
 from .base import BaseModelModule
 from core.steps.utils.face_detection import FaceAlignment, LandmarksType
@@ -12,77 +14,154 @@ from core.steps.utils.face_parsing import FaceParsing
 
 
 class LandmarkModule(BaseModelModule):
-    @task
-    def __init__(self, model_name: str, device: str, config_file: str = "core/steps/utils/dwpose/rtmpose-l_8xb32-270e_coco-ubody-wholebody-384x288.py", concurrent_per_model: int = 2, version: str = 'latest'):
+    def __init__(self, model_name: str, device: str, config_file: str = "core/steps/utils/dwpose/rtmpose-l_8xb32-270e_coco-ubody-wholebody-384x288.py", concurrent_per_model: Optional[int] = None, version: str = 'latest', batch_size: int = 32, face_batch_size: int = 4):
         """
         Args:
             model_name (str): The name of the model
             device (str): The device to load model on (e.g. 'cuda:0', 'cpu')
             config_file (str): Path to the MMPose config file
-            concurrent_per_model (int): Maximum number of concurrent tasks per model
+            concurrent_per_model (Optional[int]): Maximum number of concurrent tasks per model, device dependent by default
             version (str): Model version to use
+            batch_size (int): Maximum number of frames per pose estimation batch
+            face_batch_size (int): Maximum number of frames per face detection batch,
+                face detection runs at the input resolution so it is halved on CUDA OOM
         """
         super().__init__(model_name, device, concurrent_per_model, version)
         
         # TODO: make this configurable
         self.config_file = config_file
-        self.face_alignment = FaceAlignment(LandmarksType._2D, flip_input=False, device=self.device)
-        self.face_parsing = FaceParsing(device=self.device)
+        self.batch_size = batch_size
+        self.face_batch_size = face_batch_size
+        # Face detection and parsing networks, loaded with the model
+        self.face_alignment = None
+        self.face_parsing = None
+
+    async def load_model(self, **kwargs):
+        """Load model instance on specified device and warm it up"""
+        await super().load_model(**kwargs)
+        await asyncio.get_running_loop().run_in_executor(self.model_info['executor'], self._warmup)
 
-    @task
     async def _load_model_on_device(self, device: str, local_model_checkpoint_path: str, **kwargs) -> Any:
         """Load MMPose model on specified device"""
         if not local_model_checkpoint_path or not self.config_file:
             raise ValueError("Model checkpoint and config file must be initialized")
 
         loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._load_face_models, device)
         model = await loop.run_in_executor(
             None,
-            init_model,
-            self.config_file,
+            self._load_pose_model,
             local_model_checkpoint_path,
             device
         )
         return model
 
-    @task
+    def _load_face_models(self, device: str) -> None:
+        """Helper method to load face detection and parsing networks, face parsing in half precision on GPU"""
+        self.face_alignment = FaceAlignment(LandmarksType._2D, flip_input=False, device=device)
+        self.face_parsing = FaceParsing(device=device)
+
+        # S3FD stays in fp32, its L2Norm sums squared activations of raw pixel inputs,
+        # which overflows fp16 and its eps underflows to 0
+        if 'cuda' in device:
+            self.face_parsing.net.half()
+
+        for net in (self.face_alignment.face_detector.face_detector, self.face_parsing.net):
+            net.eval()
+            for p in net.parameters():
+                p.requires_grad_(False)
+
+    def _warmup(self) -> None:
+        """Run all networks once on a blank frame, so CUDA kernels are initialized before the first request"""
+        frame = np.zeros((256, 256, 3), dtype=np.uint8)
+        self.forward(self.model_info['model'], [frame])
+        self.face_parsing(Image.fromarray(frame))
+
+    def _load_pose_model(self, checkpoint_path: str, device: str) -> Any:
+        """Helper method to load MMPose model for inference only"""
+        model = init_model(self.config_file, checkpoint_path, device)
+        model.eval()
+        for p in model.parameters():
+            p.requires_grad_(False)
+        return model
+
+    def _inference_topdown_batch(self, model: Any, frames: List[np.ndarray]) -> List[Any]:
+        """Run top-down pose inference on several frames in a single `test_step`
+
+        Same as `mmpose.apis.inference_topdown` with the whole frame as bbox,
+        which only accepts one image per call.
+        """
+        scope = model.cfg.get('default_scope', 'mmpose')
+        if scope is not None:
+            init_default_scope(scope)
+        pipeline = Compose(model.cfg.test_dataloader.dataset.pipeline)
+
+        data_list = []
+        for frame in frames:
+            h, w = frame.shape[:2]
+            data_info = dict(img=frame,
+                             bbox=np.array([[0, 0, w, h]], dtype=np.float32),
+                             bbox_score=np.ones(1, dtype=np.float32))
+            data_info.update(model.dataset_meta)
+            data_list.append(pipeline(data_info))
+
+        return model.test_step(pseudo_collate(data_list))
+
+    def _detect_faces(self, frames: List[np.ndarray]) -> List[Optional[Tuple[int, int, int, int]]]:
+        """Detect a face bbox per frame, halving the batch size when it does not fit on the device"""
+        bboxes = []
+        i = 0
+        while i < len(frames):
+            batch_size = self.face_batch_size
+            try:
+                # view when frames is already a (N, H, W, 3) array, single copy for a list
+                bboxes += self.face_alignment.get_detections_for_batch(np.asarray(frames[i:i + batch_size]))
+                i += batch_size
+            except torch.cuda.OutOfMemoryError:
+                if batch_size == 1:
+                    raise
+                # kept for later requests, which would run out of memory the same way
+                self.face_batch_size = min(self.face_batch_size, batch_size // 2)
+                torch.cuda.empty_cache()
+                self.logger.warning(f"Face detection out of memory, retrying with batch size {self.face_batch_size}")
+        return bboxes
+
+    @torch.inference_mode()
     def forward(self, model: Any, frames: List[np.ndarray], upperbondrange=0) -> Tuple[List[np.ndarray], List[np.ndarray]]:
-        batches = [frames[i:i + 1] for i in range(0, len(frames), 1)]
         coord_placeholder = (0.0,0.0,0.0,0.0)
+        # frames may be a list or an (N, H, W, 3) array
+        if len(frames) == 0:
+            return [], frames
+
+        results = []
+        for i in range(0, len(frames), self.batch_size):
+            results += self._inference_topdown_batch(model, frames[i:i + self.batch_size])
+        bboxes = self._detect_faces(frames)
+
+        # (N, 68, 2) face landmarks of all frames
+        face_landmarks = np.concatenate([r.pred_instances.keypoints for r in results])[:, 23:91].astype(np.int32)
+
+        if upperbondrange != 0:
+            face_landmarks[:, 29, 1] = face_landmarks[:, 29, 1] + upperbondrange
+        half_face_y = face_landmarks[:, 29, 1]
+        half_face_dist = face_landmarks[:, :, 1].max(axis=1) - half_face_y
+        upper_bond = half_face_y - half_face_dist
+
+        f_landmarks = np.stack([face_landmarks[:, :, 0].min(axis=1),
+                                upper_bond,
+                                face_landmarks[:, :, 0].max(axis=1),
+                                face_landmarks[:, :, 1].max(axis=1)], axis=1)
+        x1, y1, x2, y2 = f_landmarks.T
+        invalid = (y2 - y1 <= 0) | (x2 - x1 <= 0) | (x1 < 0)
+
         coords_list = []
-        average_range_minus = []
-        average_range_plus = []
-
-        for frame in batches:
-            results = inference_topdown(model, np.asarray([frame])[0])
-            results = merge_data_samples(results)
-            keypoints = results.pred_instances.keypoints
-            face_landmark: np.ndarray = keypoints[0][23:91]
-            face_landmark = face_landmark.astype(np.int32)
-            bbox = self.face_alignment.get_detections_for_batch(np.asarray(frame))
-            for _, f in enumerate(bbox):
-                if f is None: # no face in the image
-                    coords_list += [coord_placeholder]
-                    continue
-                
-                half_face_coord =  face_landmark[29]
-                range_minus = (face_landmark[30]- face_landmark[29])[1]
-                range_plus = (face_landmark[29]- face_landmark[28])[1]
-                average_range_minus.append(range_minus)
-                average_range_plus.append(range_plus)
-                if upperbondrange != 0:
-                    half_face_coord[1] = upperbondrange+half_face_coord[1]
-                half_face_dist = np.max(face_landmark[:,1]) - half_face_coord[1]
-                upper_bond = half_face_coord[1]-half_face_dist
-                
-                f_landmark = (np.min(face_landmark[:, 0]),int(upper_bond),np.max(face_landmark[:, 0]),np.max(face_landmark[:,1]))
-                x1, y1, x2, y2 = f_landmark
-                
-                if y2-y1<=0 or x2-x1<=0 or x1<0:
-                    coords_list += [f]
-                    _w, _h = f[2]-f[0], f[3]-f[1]
-                    self.logger.error(f"error bbox: {f}")
-                else:
-                    coords_list += [f_landmark]
-            
-        return coords_list, frames
\ No newline at end of file
+        for f, f_landmark, is_invalid in zip(bboxes, f_landmarks, invalid):
+            if f is None: # no face in the image
+                coords_list += [coord_placeholder]
+            elif is_invalid:
+                coords_list += [f]
+                self.logger.error(f"error bbox: {f}")
+            else:
+                coords_list += [tuple(f_landmark)]
+
+        return coords_list, frames
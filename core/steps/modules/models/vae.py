@@ -1,9 +1,15 @@
 import asyncio
+import itertools
+import queue
+import threading
+import types
 import numpy as np
 import torch
 import torchvision.transforms.functional as TF
-from typing import Any, List
-from prefect import task
+from torchvision.io import ImageReadMode, decode_jpeg
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
 from diffusers import AutoencoderTiny
 from PIL import Image
 import io
@@ -11,19 +17,35 @@ import io
 from .base import BaseModelModule
 
 
+_JPEG_MAGIC = b'\xff\xd8'
+
+# pinned staging buffer sets shared by the inference threads, page-locked memory is never paged out
+_MAX_STAGING_SETS = 2
+
+
 class VAEModule(BaseModelModule):
-    @task
-    def __init__(self, model_name: str = "madebyollin/taesd", device: str = "cuda", concurrent_per_model: int = 2, version: str = 'latest'):
+    def __init__(self, model_name: str = "madebyollin/taesd", device: str = "cuda", concurrent_per_model: Optional[int] = None, version: str = 'latest', batch_size: int = 32, resolution: Tuple[int, int] = (512, 512)):
         """
         Args:
             model_name (str): The name/path of the model on HuggingFace
             device (str): The device to load model on (e.g. 'cuda:0', 'cpu')
-            concurrent_per_model (int): Maximum number of concurrent tasks per model
+            concurrent_per_model (Optional[int]): Maximum number of concurrent tasks per model, device dependent by default
             version (str): Model version to use
+            batch_size (int): Maximum number of frames per encoder call, every batch is padded to it on GPU
+            resolution (Tuple[int, int]): Deployed frame (height, width), the encoder is compiled for it at load time
         """
         super().__init__(model_name, device, concurrent_per_model, version)
+        self.batch_size = batch_size
+        self.resolution = resolution
+
+        # image decoding releases the GIL, so frames are decoded in parallel
+        self.decode_executor = ThreadPoolExecutor(thread_name_prefix=f"{self.__class__.__name__}-decode")
+
+        # CUDA streams and pinned staging buffers, shared by the inference threads
+        self._cuda_buffers = queue.LifoQueue()
+        for _ in range(_MAX_STAGING_SETS):
+            self._cuda_buffers.put(types.SimpleNamespace(shape=None))
 
-    @task
     async def _load_model_on_device(self, device: str, local_model_checkpoint_path: str, **kwargs) -> Any:
         """Load AutoencoderTiny model on specified device"""
         if not local_model_checkpoint_path:
@@ -45,8 +67,53 @@ class VAEModule(BaseModelModule):
             torch_dtype=torch.float16
         ).to(device)
         model.eval()
+        for p in model.parameters():
+            p.requires_grad_(False)
+
+        if model.device.type == 'cuda':
+            # Fuse the small conv kernels of the encoder into a CUDA graph
+            model = model.to(memory_format=torch.channels_last)
+            model.encoder = torch.compile(model.encoder, mode='reduce-overhead', fullgraph=True)
         return model
 
+    async def load_model(self, **kwargs):
+        """Load model instance on specified device and warm up every inference thread"""
+        await super().load_model(**kwargs)
+        if not self.device.startswith('cuda'):
+            return
+
+        # CUDA graph trees are recorded per thread, so each inference thread records its own
+        # before the first request. The barrier makes every warmup land on a different thread.
+        workers = self.concurrent_per_model
+        barrier = threading.Barrier(workers)
+        lock = threading.Lock()
+
+        def _warmup_thread() -> None:
+            barrier.wait()
+            with lock:
+                self._warmup()
+
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.model_info['executor'], _warmup_thread)
+                               for _ in range(workers)])
+
+    @torch.inference_mode()
+    def _warmup(self) -> None:
+        """Compile and record the encoder for a full batch at the deployed resolution
+
+        Runs two batches: CUDA graph trees run the first call of a graph eagerly
+        and only record it on the second.
+        """
+        model = self.model_info['model']
+        image = torch.zeros((3, *self.resolution))
+        self._encode_cuda(model, [image] * (2 * self.batch_size))
+        torch.cuda.synchronize(model.device)
+
+    def close(self) -> None:
+        """Release inference and image decoding threads"""
+        super().close()
+        self.decode_executor.shutdown(wait=True)
+
     def _preprocess_image(self, image_bytes: bytes) -> torch.Tensor:
         """Preprocess image bytes to tensor
         
@@ -65,7 +132,119 @@ class VAEModule(BaseModelModule):
         
         return image
 
-    @task
+    def _preprocess_jpeg_on_device(self, image_bytes: bytes, device: torch.device, dtype: torch.dtype) -> torch.Tensor:
+        """Decode JPEG bytes on GPU with nvjpeg and normalize to [-1, 1]
+        
+        Args:
+            image_bytes: Raw JPEG bytes
+            device: CUDA device to decode on
+            dtype: Output dtype
+            
+        Returns:
+            torch.Tensor: Preprocessed image tensor on device
+        """
+        data = torch.frombuffer(bytearray(image_bytes), dtype=torch.uint8)
+        try:
+            image = decode_jpeg(data, mode=ImageReadMode.RGB, device=device)
+        except RuntimeError:
+            # JPEGs nvjpeg does not support (e.g. CMYK) are decoded on CPU with PIL
+            return self._preprocess_image(image_bytes).to(device, dtype=dtype)
+        return image.to(dtype).div_(127.5).sub_(1.0)
+
+    def _decode_images(self, frames: List[bytes]) -> Iterator[torch.Tensor]:
+        """Decode frames in the background, at most 2 batches ahead of the consumer to bound host memory"""
+        frames = iter(frames)
+        pending = deque(self.decode_executor.submit(self._preprocess_image, frame_bytes)
+                        for frame_bytes in itertools.islice(frames, 2 * self.batch_size))
+        try:
+            while pending:
+                image = pending.popleft().result()
+                for frame_bytes in itertools.islice(frames, 1):
+                    pending.append(self.decode_executor.submit(self._preprocess_image, frame_bytes))
+                yield image
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _batched(self, images: Iterable[torch.Tensor]) -> Iterator[List[torch.Tensor]]:
+        """Group images into batches of at most `batch_size`"""
+        batch = []
+        for image in images:
+            batch.append(image)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _prepare_cuda_buffers(self, buffers: types.SimpleNamespace, model: AutoencoderTiny, image_shape: Tuple[int, ...]) -> types.SimpleNamespace:
+        """Allocate the CUDA stream and double pinned staging buffers of a buffer set for `image_shape` images"""
+        shape = (self.batch_size, *image_shape)
+        if buffers.shape != shape:
+            if buffers.shape is None:
+                buffers.stream = torch.cuda.Stream(device=model.device)
+                buffers.copied = [torch.cuda.Event() for _ in range(2)]
+            else:
+                # previous copies out of the old buffers must be done before they are released
+                for event in buffers.copied:
+                    event.synchronize()
+            buffers.shape = shape
+            # staged in the model dtype, so the host to device copy is a plain DMA of half the bytes
+            buffers.staging = [torch.empty(shape, dtype=model.dtype, pin_memory=True) for _ in range(2)]
+        return buffers
+
+    def _encode_cuda(self, model: AutoencoderTiny, images: Iterable[torch.Tensor]) -> List[torch.Tensor]:
+        """Encode batches on a side CUDA stream with double buffered pinned staging
+
+        Staging the next batch on CPU overlaps with the copy and encoding of the
+        previous batch on GPU. The last batch is padded to `batch_size`, so the
+        encoder always runs with the shape it was compiled for.
+        """
+        latents = []
+        stream = None
+        # blocks while all buffer sets are used by other inference threads
+        buffers = self._cuda_buffers.get()
+        try:
+            for i, batch in enumerate(self._batched(images)):
+                self._prepare_cuda_buffers(buffers, model, tuple(batch[0].shape))
+                stream, slot = buffers.stream, i % 2
+
+                # Wait until the previous copy out of this buffer is done before overwriting it
+                buffers.copied[slot].synchronize()
+                staging = buffers.staging[slot]
+                for row, image in zip(staging, batch):
+                    row.copy_(image)
+                staging[len(batch):].zero_()
+
+                with torch.cuda.stream(stream):
+                    gpu_batch = staging.to(model.device, non_blocking=True)
+                    buffers.copied[slot].record(stream)
+                    gpu_batch = gpu_batch.contiguous(memory_format=torch.channels_last)
+                    # CUDA graph outputs are overwritten by the next run, keep a copy
+                    latents.append(model.encoder(gpu_batch)[:len(batch)].clone())
+
+            if stream is not None:
+                torch.cuda.current_stream(model.device).wait_stream(stream)
+        finally:
+            self._cuda_buffers.put(buffers)
+        return latents
+
+    def _encode_jpeg_on_device(self, model: AutoencoderTiny, frames: List[bytes]) -> List[torch.Tensor]:
+        """Decode JPEG frames on GPU and encode them, without host decoding or host to device copies"""
+        latents = []
+        for i in range(0, len(frames), self.batch_size):
+            images = [self._preprocess_jpeg_on_device(frame_bytes, model.device, model.dtype)
+                      for frame_bytes in frames[i:i + self.batch_size]]
+            # Pad to `batch_size`, the shape the encoder was compiled for
+            batch = torch.zeros((self.batch_size, *images[0].shape), device=model.device, dtype=model.dtype,
+                                memory_format=torch.channels_last)
+            for row, image in zip(batch, images):
+                row.copy_(image)
+            # CUDA graph outputs are overwritten by the next run, keep a copy
+            latents.append(model.encoder(batch)[:len(images)].clone())
+        return latents
+
+    @torch.inference_mode()
     def forward(self, model: AutoencoderTiny, frames: List[bytes]) -> List[np.ndarray]:
         """Encode frames using the VAE encoder
         
@@ -77,20 +256,20 @@ class VAEModule(BaseModelModule):
             List of encoded frame latents as numpy arrays
         """
         encoded_frames = []
-        
-        with torch.no_grad():
-            for frame_bytes in frames:
-                # Preprocess image bytes to tensor
-                image = self._preprocess_image(frame_bytes)
-                
-                # Add batch dimension and move to device
-                image = image.unsqueeze(0)
-                image = image.to(model.device, dtype=model.dtype)
-                
-                # Encode
-                latents = model.encoder(image)
-                
-                # Convert to numpy and append
-                encoded_frames.append(latents[0].cpu().numpy())
+
+        if model.device.type == 'cuda' and all(frame_bytes[:2] == _JPEG_MAGIC for frame_bytes in frames):
+            latents = self._encode_jpeg_on_device(model, frames)
+        else:
+            # Frames keep decoding in the background while earlier batches are encoded
+            images = self._decode_images(frames)
+            if model.device.type == 'cuda':
+                latents = self._encode_cuda(model, images)
+            else:
+                latents = [model.encoder(torch.stack(batch, dim=0).to(model.device, dtype=model.dtype))
+                           for batch in self._batched(images)]
+
+        # Convert to numpy
+        for batch_latents in latents:
+            encoded_frames.extend(batch_latents.cpu().numpy())
         
         return encoded_frames
@@ -0,0 +1,4 @@
+from .s3_module import S3Module, close_clients
+
+
+__all__ = ['S3Module', 'close_clients']
\ No newline at end of file
@@ -1,11 +1,77 @@
 import aioboto3
+import asyncio
 import os
+import tempfile
 
+from async_lru import alru_cache
 from prefect import task
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
 from models.errors import S3DownloadError, S3ListError
 from models.s3 import S3DownloadParams
+from utils import setup_logger
+
+
+logger = setup_logger(name="avatar.s3")
+
+
+# process-wide session and long-lived clients per region, shared by all S3Module instances
+_SESSION = aioboto3.Session()
+_CLIENTS: Dict[str, Any] = {}
+_CLIENT_CONTEXTS: Dict[str, Any] = {}
+_CLIENTS_LOCK = asyncio.Lock()
+
+
+async def _get_client(region: str) -> Any:
+    """Get the shared S3 client of region, opening it on first use"""
+    async with _CLIENTS_LOCK:
+        if region not in _CLIENTS:
+            context = _SESSION.client('s3', region_name=region)
+            _CLIENTS[region] = await context.__aenter__()
+            _CLIENT_CONTEXTS[region] = context
+    return _CLIENTS[region]
+
+
+async def close_clients() -> None:
+    """Close all shared S3 clients, on application shutdown"""
+    async with _CLIENTS_LOCK:
+        try:
+            for region, context in _CLIENT_CONTEXTS.items():
+                # one failing client must not leave the others open
+                try:
+                    await context.__aexit__(None, None, None)
+                except Exception as e:
+                    logger.error(f"Failed to close S3 client of region {region}: {str(e)}")
+        finally:
+            _CLIENTS.clear()
+            _CLIENT_CONTEXTS.clear()
+
+
+@alru_cache(maxsize=64, ttl=60)
+async def _list_objects(region: str, bucket: str, prefix: str) -> Tuple[Tuple[str, datetime], ...]:
+    """
+    List (key, last modified) of all objects under prefix.
+    Cached for a short time, so modules sharing a prefix do not list it again.
+    """
+    s3_client = await _get_client(region)
+    paginator = s3_client.get_paginator('list_objects_v2')
+    objects = []
+
+    async for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        if 'Contents' in page:
+            objects.extend((obj['Key'], obj['LastModified']) for obj in page['Contents'])
+
+    return tuple(objects)
+
+
+def _pwrite_all(fd: int, data: bytes, offset: int) -> None:
+    """Write all of data to fd at offset"""
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
 
 
 class S3Module:
@@ -14,9 +80,7 @@ class S3Module:
         self.base_dir = s3_params.s3_base_object_path.rstrip('/')
         self.region = s3_params.s3_region
         self.local_dir = Path(s3_params.local_dir)
-        self.session = aioboto3.Session()
 
-    @task
     async def download_to_local(self, filename: str) -> str:
         """
         Asynchronously download a file from S3 to the local directory.
@@ -37,18 +101,90 @@ class S3Module:
             # Ensure local directory exists
             os.makedirs(os.path.dirname(local_path), exist_ok=True)
             
-            async with self.session.client('s3', region_name=self.region) as s3_client:
-                await s3_client.download_file(
-                    Bucket=self.bucket,
-                    Key=s3_path,
-                    Filename=str(local_path)
-                )
+            s3_client = await _get_client(self.region)
+            await s3_client.download_file(
+                Bucket=self.bucket,
+                Key=s3_path,
+                Filename=str(local_path)
+            )
             
             return str(local_path)
         except Exception as e:
             raise S3DownloadError(f"Failed to download file: {str(e)}", s3_path)
 
-    @task
+    async def download_to_local_multipart(self, filename: str, part_size: int = 16 * 1024 * 1024, concurrency: int = 16) -> str:
+        """
+        Asynchronously download a large file from S3 to the local directory,
+        fetching byte ranges concurrently and writing each at its offset.
+        
+        Args:
+            filename (str): File name to download
+            part_size (int): Size in bytes of each ranged request
+            concurrency (int): Maximum number of concurrent ranged requests
+            
+        Returns:
+            str: Local file path
+            
+        Raises:
+            S3DownloadError: If download fails
+        """
+        s3_path = f"{self.base_dir}/{filename}"
+        local_path = self.local_dir / filename
+        
+        try:
+            # Ensure local directory exists
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            
+            s3_client = await _get_client(self.region)
+            head = await s3_client.head_object(Bucket=self.bucket, Key=s3_path)
+            size = head['ContentLength']
+            sem = asyncio.Semaphore(concurrency)
+            writes = []
+
+            # Download next to the destination, only a complete file is moved into place
+            fd, tmp_path = tempfile.mkstemp(dir=local_path.parent, prefix=f".{local_path.name}.")
+            try:
+                os.fchmod(fd, 0o644)
+                os.ftruncate(fd, size)
+
+                async def _download_part(start: int) -> None:
+                    end = min(start + part_size, size) - 1
+                    async with sem:
+                        response = await s3_client.get_object(
+                            Bucket=self.bucket,
+                            Key=s3_path,
+                            Range=f"bytes={start}-{end}",
+                            # fail instead of mixing parts if the object is replaced meanwhile
+                            IfMatch=head['ETag']
+                        )
+                        data = await response['Body'].read()
+                    # a started write runs to completion even if this part is cancelled
+                    write = asyncio.ensure_future(asyncio.to_thread(_pwrite_all, fd, data, start))
+                    writes.append(write)
+                    await asyncio.shield(write)
+
+                parts = [asyncio.ensure_future(_download_part(start)) for start in range(0, size, part_size)]
+                try:
+                    await asyncio.gather(*parts)
+                except BaseException:
+                    # gather does not cancel the other parts, stop them before the fd is closed
+                    for part in parts:
+                        part.cancel()
+                    await asyncio.gather(*parts, return_exceptions=True)
+                    raise
+                finally:
+                    await asyncio.gather(*writes, return_exceptions=True)
+            except BaseException:
+                os.close(fd)
+                os.unlink(tmp_path)
+                raise
+
+            os.close(fd)
+            os.replace(tmp_path, local_path)
+            return str(local_path)
+        except Exception as e:
+            raise S3DownloadError(f"Failed to download file: {str(e)}", s3_path)
+
     async def upload_to_s3(self, local_path: str, s3_filename: Optional[str] = None) -> str:
         """
         Asynchronously upload a file to S3.
@@ -68,17 +204,16 @@ class S3Module:
         s3_path = f"{self.base_dir}/{s3_filename}"
         
         try:
-            async with self.session.client('s3', region_name=self.region) as s3_client:
-                await s3_client.upload_file(
-                    Filename=str(local_path),
-                    Bucket=self.bucket,
-                    Key=s3_path
-                )
+            s3_client = await _get_client(self.region)
+            await s3_client.upload_file(
+                Filename=str(local_path),
+                Bucket=self.bucket,
+                Key=s3_path
+            )
             return s3_path
         except Exception as e:
             raise S3DownloadError(f"Failed to upload file: {str(e)}", s3_path)
 
-    @task
     async def list_files(self, prefix: Optional[str] = None) -> List[str]:
         """
         List files in S3 bucket with optional prefix.
@@ -91,57 +226,54 @@ class S3Module:
         """
         try:
             full_prefix = f"{self.base_dir}/{prefix if prefix else ''}"
-            async with self.session.client('s3', region_name=self.region) as s3_client:
-                paginator = s3_client.get_paginator('list_objects_v2')
-                files = []
+            objects = await _list_objects(self.region, self.bucket, full_prefix)
                 
-                async for page in paginator.paginate(Bucket=self.bucket, Prefix=full_prefix):
-                    if 'Contents' in page:
-                        files.extend([obj['Key'] for obj in page['Contents']])
-                
-                # Remove base_dir prefix from results
-                return [f.replace(f"{self.base_dir}/", "") for f in files]
+            # Remove base_dir prefix from results
+            return [key.replace(f"{self.base_dir}/", "") for key, _ in objects]
         except Exception as e:
             raise S3ListError(str(e), self.bucket, self.base_dir)
 
-    @task
-    async def batch_download(self, filenames: List[str]) -> List[str]:
+    async def batch_download(self, filenames: List[str], concurrency: int = 16) -> List[str]:
         """
-        Download multiple files from S3.
+        Download multiple files from S3 concurrently.
         
         Args:
             filenames (List[str]): List of filenames to download
+            concurrency (int): Maximum number of concurrent downloads
             
         Returns:
             List[str]: List of local file paths
         """
-        local_paths = []
-        for filename in filenames:
-            local_path = await self.download_to_local(filename)
-            local_paths.append(local_path)
-        return local_paths
+        sem = asyncio.Semaphore(concurrency)
 
-    @task
-    async def batch_upload(self, local_paths: List[str], s3_filenames: Optional[List[str]] = None) -> List[str]:
+        async def _download(filename: str) -> str:
+            async with sem:
+                return await self.download_to_local(filename)
+
+        return await asyncio.gather(*[_download(filename) for filename in filenames])
+
+    async def batch_upload(self, local_paths: List[str], s3_filenames: Optional[List[str]] = None, concurrency: int = 16) -> List[str]:
         """
-        Upload multiple files to S3.
+        Upload multiple files to S3 concurrently.
         
         Args:
             local_paths (List[str]): List of local file paths
             s3_filenames (Optional[List[str]]): Optional list of custom S3 filenames
+            concurrency (int): Maximum number of concurrent uploads
             
         Returns:
             List[str]: List of S3 paths
         """
-        s3_paths = []
+        sem = asyncio.Semaphore(concurrency)
         s3_filenames = s3_filenames or [None] * len(local_paths)
-        
-        for local_path, s3_filename in zip(local_paths, s3_filenames):
-            s3_path = await self.upload_to_s3(local_path, s3_filename)
-            s3_paths.append(s3_path)
-        return s3_paths
 
-    @task
+        async def _upload(local_path: str, s3_filename: Optional[str]) -> str:
+            async with sem:
+                return await self.upload_to_s3(local_path, s3_filename)
+
+        return await asyncio.gather(*[_upload(local_path, s3_filename)
+                                      for local_path, s3_filename in zip(local_paths, s3_filenames)])
+
     async def get_latest_version(self, prefix: Optional[str] = None) -> Optional[str]:
         """
         Get the latest version file from S3 bucket.
@@ -154,60 +286,52 @@ class S3Module:
         """
         try:
             full_prefix = f"{self.base_dir}/{prefix if prefix else ''}"
-            async with self.session.client('s3', region_name=self.region) as s3_client:
-                paginator = s3_client.get_paginator('list_objects_v2')
-                latest_file = None
-                latest_time = None
+            objects = await _list_objects(self.region, self.bucket, full_prefix)
                 
-                async for page in paginator.paginate(Bucket=self.bucket, Prefix=full_prefix):
-                    if 'Contents' in page:
-                        for obj in page['Contents']:
-                            if latest_time is None or obj['LastModified'] > latest_time:
-                                latest_time = obj['LastModified']
-                                latest_file = obj['Key']
-                
-                if latest_file:
-                    return latest_file.replace(f"{self.base_dir}/", "")
-                return None
+            if objects:
+                latest_file, _ = max(objects, key=lambda obj: obj[1])
+                return latest_file.replace(f"{self.base_dir}/", "")
+            return None
                 
         except Exception as e:
             raise S3ListError(str(e), self.bucket, self.base_dir)
 
     @task
-    async def download_latest(self, prefix: Optional[str] = None) -> Optional[str]:
+    async def download_latest(self, prefix: Optional[str] = None, multipart: bool = False) -> Optional[str]:
         """
         Download the latest version file from S3.
         
         Args:
             prefix (Optional[str]): Prefix to filter files
+            multipart (bool): Download with concurrent ranged requests, for large files
             
         Returns:
             Optional[str]: Local path of downloaded file or None if no files found
         """
         latest_file = await self.get_latest_version(prefix)
         if latest_file:
+            if multipart:
+                return await self.download_to_local_multipart(latest_file)
             return await self.download_to_local(latest_file)
         return None
 
     @task
-    async def download_version(self, model_name: str, version: str) -> Optional[str]:
+    async def download_version(self, model_name: str, version: str, multipart: bool = False) -> Optional[str]:
         """
         Download specific version of model file from S3.
         
         Args:
             model_name (str): Name of the model
             version (str): Version number
+            multipart (bool): Download with concurrent ranged requests, for large files
             
         Returns:
             Optional[str]: Local path of downloaded file or None if not found
         """
         try:
-            # List files in version directory
-            files = await self.list_files()
-            
-            # Filter for model files with specific version
+            # List model files with specific version, filtered by S3
             version_prefix = f"v{version}"
-            model_files = [f for f in files if f.startswith(version_prefix)]
+            model_files = await self.list_files(version_prefix)
             
             if not model_files:
                 return None
@@ -216,6 +340,8 @@ class S3Module:
             latest_file = sorted(model_files)[-1]
             
             # Download the file
+            if multipart:
+                return await self.download_to_local_multipart(latest_file)
             local_path = await self.download_to_local(latest_file)
             return local_path
             
@@ -40,6 +40,7 @@ class FaceParsing():
                 img = torch.unsqueeze(img, 0).cuda()
             else:
                 img = torch.unsqueeze(img, 0)
+            img = img.to(next(self.net.parameters()).dtype)
             out = self.net(img)[0]
             parsing = out.squeeze(0).cpu().numpy().argmax(0)
             parsing[np.where(parsing>13)] = 0
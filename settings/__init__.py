@@ -1,6 +1,14 @@
-from .config import settings
+from .config import (settings,
+                     AWS_REGION,
+                     MODELS_S3_BUCKET_NAME,
+                     MODELS_S3_OBJECT_BASE_NAME,
+                     CONCURRENT_PER_MODEL)
 
 
 __all__ = [
-    "settings"
+    "settings",
+    "AWS_REGION",
+    "MODELS_S3_BUCKET_NAME",
+    "MODELS_S3_OBJECT_BASE_NAME",
+    "CONCURRENT_PER_MODEL"
 ]
\ No newline at end of file
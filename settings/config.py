@@ -1,11 +1,15 @@
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 from pydantic import Field
+from typing import Optional
 
 
 class Settings(BaseSettings):
+    model_config = SettingsConfigDict(frozen=True)
+
     LOG_LEVEL: str = Field(default="DEBUG", description="Log level")
     BASE_PREFIX: str = Field(default="/api/v1", description="Base prefix")
+    CONCURRENT_PER_MODEL: Optional[int] = Field(default=None, description="Max concurrent inferences per model, defaults to 1 on CPU and 4 on GPU")
     
     # aws config
     AWS_ACCESS_KEY_ID: str = Field(..., description="AWS access key id")
@@ -22,4 +26,10 @@ def get_settings() -> Settings:
     return Settings()
 
 
-settings: Settings = get_settings()
\ No newline at end of file
+settings: Settings = get_settings()
+
+# Snapshot of settings read on hot paths
+AWS_REGION: str = settings.AWS_REGION
+MODELS_S3_BUCKET_NAME: str = settings.MODELS_S3_BUCKET_NAME
+MODELS_S3_OBJECT_BASE_NAME: str = settings.MODELS_S3_OBJECT_BASE_NAME
+CONCURRENT_PER_MODEL: Optional[int] = settings.CONCURRENT_PER_MODEL
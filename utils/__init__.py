@@ -3,11 +3,8 @@ from .exception_handlers import (http_exception_handler,
                                 validation_exception_handler,
                                 generic_exception_handler,
                                 runtime_exception_handler,
-                                s3_download_exception_handler,
-                                unzip_exception_handler,
-                                s3_list_exception_handler,
-                                data_build_exception_handler,
-                                cuda_exception_handler
+                                domain_exception_handler,
+                                DOMAIN_EXCEPTIONS
                                 )
 from .helpers import get_models
 
@@ -18,10 +15,7 @@ __all__ = [
     "validation_exception_handler",
     "generic_exception_handler",
     "runtime_exception_handler",
-    "s3_download_exception_handler",
-    "unzip_exception_handler",
-    "s3_list_exception_handler",
-    "data_build_exception_handler",
-    "cuda_exception_handler",
+    "domain_exception_handler",
+    "DOMAIN_EXCEPTIONS",
     "get_models"
 ]
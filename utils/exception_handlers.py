@@ -1,5 +1,5 @@
 from fastapi import Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.exceptions import RequestValidationError
 from models.errors import S3DownloadError, UnzipError, S3ListError, DataValidationError, CudaError
 from .logging import setup_logger
@@ -8,77 +8,60 @@ from .logging import setup_logger
 logger = setup_logger(name="avatar.exception.handler")
 
 
-async def http_exception_handler(request: Request, exc: HTTPException):
-    logger.error(f"HTTP error: {exc.status_code} - {exc.detail}")
-    return JSONResponse(
+def http_exception_handler(request: Request, exc: HTTPException):
+    logger.error("HTTP error: %s - %s", exc.status_code, exc.detail, exc_info=exc)
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"message": f"HTTP error: {exc.detail}"}
     )
 
 
-async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    logger.error(f"Validation error: {exc.errors()}")
-    return JSONResponse(
+def validation_exception_handler(request: Request, exc: RequestValidationError):
+    errors = exc.errors()
+    logger.error("Validation error: %s", errors, exc_info=exc)
+    return ORJSONResponse(
         status_code=422,
-        content={"message": "Validation error", "details": exc.errors()}
+        content={"message": "Validation error", "details": errors}
     )
 
 
-async def generic_exception_handler(request: Request, exc: Exception):
-    logger.exception("An unexpected error occurred")
-    return JSONResponse(
+def generic_exception_handler(request: Request, exc: Exception):
+    logger.exception("An unexpected error occurred", exc_info=exc)
+    return ORJSONResponse(
         status_code=500,
         content={"message": "An unexpected error occurred", "detail": str(exc)}
     )
 
 
-async def runtime_exception_handler(request: Request, exc: RuntimeError):
-    logger.error(f"Runtime error: {str(exc)}")
-    return JSONResponse(
+def runtime_exception_handler(request: Request, exc: RuntimeError):
+    details = str(exc)
+    logger.error("Runtime error: %s", details, exc_info=exc)
+    return ORJSONResponse(
         status_code=500,
-        content={"message": "Runtime error", "details": str(exc)}
+        content={"message": "Runtime error", "details": details}
     )
 
 
-async def s3_download_exception_handler(request: Request, exc: S3DownloadError):
-    logger.error(f"S3 download error: {exc.message} - S3 path: {exc.s3_path}")
-    return JSONResponse(
-        status_code=500,
-        content={"message": f"S3 download error: {exc.message}", "s3_path": exc.s3_path},
-    )
-
+# Domain errors only differ by message prefix and the attributes echoed back
+_HANDLERS = {
+    S3DownloadError: ("S3 download error: ", ("s3_path",)),
+    UnzipError: ("Unzip error: ", ("zip_path",)),
+    S3ListError: ("S3 list error: ", ("s3_bucket", "s3_base_object_path")),
+    DataValidationError: ("Data class building error, ", ()),
+    CudaError: ("Cuda initializing error, ", ()),
+}
 
-async def unzip_exception_handler(request: Request, exc: UnzipError):
-    logger.error(f"Unzip error: {exc.message} - Zip path: {exc.zip_path}")
-    return JSONResponse(
-        status_code=500,
-        content={"message": f"Unzip error: {exc.message}", "zip_path": exc.zip_path},
-    )
+DOMAIN_EXCEPTIONS = tuple(_HANDLERS)
 
 
-async def s3_list_exception_handler(request: Request, exc: S3ListError):
-    logger.error(f"S3 list error: {exc.message} - Bucket: {exc.s3_bucket}, Base path: {exc.s3_base_object_path}")
-    return JSONResponse(
+def domain_exception_handler(request: Request, exc: Exception):
+    # Starlette resolves handlers through the MRO, so subclasses land here too
+    prefix, fields = next(_HANDLERS[cls] for cls in type(exc).__mro__ if cls in _HANDLERS)
+    message = prefix + exc.message
+    details = {field: getattr(exc, field) for field in fields}
+    # echoed fields become top-level keys of the JSON log record
+    logger.error(message, extra=details, exc_info=exc)
+    return ORJSONResponse(
         status_code=500,
-        content={
-            "message": f"S3 list error: {exc.message}",
-            "s3_bucket": exc.s3_bucket,
-            "s3_base_object_path": exc.s3_base_object_path
-        },
+        content={"message": message, **details}
     )
-
-
-async def data_build_exception_handler(request: Request, exc: DataValidationError):
-    logger.error(f"Data class building error: {exc.message}")
-    return JSONResponse(
-        status_code=500,
-        content={"message": f"Data class building error, {exc.message}"}
-    )
-    
-
-async def cuda_exception_handler(request: Request, exc: CudaError):
-    logger.error(f"Cuda initializing error: {exc.message}")
-    return JSONResponse(
-        status_code=500,
-        content={"message": f"Cuda initializing error, {exc.message}"}
-    )
\ No newline at end of file
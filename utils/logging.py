@@ -1,42 +1,130 @@
+import atexit
 import logging
-import json
+import logging.handlers
+import orjson
+import queue
 import sys
 import traceback
 import os
 
+from collections.abc import Mapping
+from typing import Dict
+
 from settings import settings
 
-logging.basicConfig(
-        level=settings.LOG_LEVEL,
-        format='%(message)s'
-    )
+_THIS_FILE = __file__
+_LEVEL_NAMES = {
+    logging.DEBUG: "debug",
+    logging.INFO: "info",
+    logging.WARNING: "warning",
+    logging.ERROR: "error",
+    logging.CRITICAL: "critical",
+}
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records unformatted, so they are serialized in the listener thread instead of the caller's"""
+
+    def prepare(self, record):
+        # the queue is in-process, the record does not need to be made picklable
+        return record
+
+
+# Loggers only enqueue records; a background listener thread serializes and writes them to stdout
+_log_queue = queue.SimpleQueue()
+_stream_handler = logging.StreamHandler(sys.stdout)
+_stream_handler.setFormatter(logging.Formatter('%(message)s'))
+_listener = logging.handlers.QueueListener(_log_queue, _stream_handler, respect_handler_level=True)
+
+_root_logger = logging.getLogger()
+_root_logger.setLevel(settings.LOG_LEVEL)
+_root_logger.addHandler(_DeferredQueueHandler(_log_queue))
+_listener.start()
+# flush pending records on exit
+atexit.register(_listener.stop)
+
+
+def _format_message(msg, args):
+    """Merge %-style args into msg like `LogRecord.getMessage`, reporting bad format calls instead of raising"""
+    msg = str(msg)
+    if len(args) == 1 and isinstance(args[0], Mapping) and args[0]:
+        args = args[0]
+    try:
+        return msg % args
+    except (TypeError, ValueError):
+        # same report as `Handler.handleError`, the record is still logged with the raw message
+        if logging.raiseExceptions and sys.stderr:
+            sys.stderr.write('--- Logging error ---\n')
+            traceback.print_exc(file=sys.stderr)
+            sys.stderr.write(f'Message: {msg!r}\nArguments: {args!r}\n')
+        return msg
+
+
+class _LazyTraceback:
+    """Traceback of an exc_info tuple, only formatted when the log record is serialized"""
+    __slots__ = ('exc_info',)
+
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+    def __str__(self):
+        exc_type, exc_value, exc_traceback = self.exc_info
+        # Cached on the exception so re-logging it skips the linecache walk, keyed by the
+        # traceback object since a re-raised exception gains outer frames
+        cached = getattr(exc_value, '__cached_tb_str__', None)
+        if cached is not None and cached[0] is exc_traceback:
+            return cached[1]
+
+        formatted = ''.join(traceback.TracebackException(exc_type, exc_value, exc_traceback).format())
+        try:
+            exc_value.__cached_tb_str__ = (exc_traceback, formatted)
+        except AttributeError:
+            pass
+        return formatted
+
+
+class _LazyJSON:
+    """Log record data, only serialized to JSON when a handler formats the record"""
+    __slots__ = ('data', '_json')
+
+    def __init__(self, data):
+        self.data = data
+        self._json = None
+
+    def __str__(self):
+        if self._json is None:
+            self._json = orjson.dumps(self.data, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+        return self._json
 
 
 class JSONAdapter(logging.LoggerAdapter):
     def __init__(self, logger, extra=None):
         super().__init__(logger, extra or {})
+        # log record template with the adapter's constant extra fields
+        self._proto = {"message": None, "level": None, **self.extra}
 
     def process(self, msg, kwargs):
-        level = kwargs.pop('level', self.logger.getEffectiveLevel())
-        level_name = logging.getLevelName(level).lower()
+        level = kwargs.pop('level')
+        level_name = _LEVEL_NAMES.get(level) or logging.getLevelName(level).lower()
 
-        log_data = {
-            "message": str(msg),
-            "level": level_name
-        }
+        log_data = self._proto.copy()
+        log_data["message"] = str(msg)
+        log_data["level"] = level_name
 
-        if level_name.upper() in ['ERROR', 'CRITICAL', 'EXCEPTION']:
+        if level >= logging.ERROR:
             exc_info = kwargs.get('exc_info')
             if exc_info:
                 if isinstance(exc_info, bool):
                     exc_info = sys.exc_info()
-                if isinstance(exc_info, tuple) and len(exc_info) == 3:
-                    exc_type, exc_value, exc_traceback = exc_info
-                    tb = traceback.extract_tb(exc_traceback)
-                    if tb:
-                        filename, lineno, _, _ = tb[-1]  # Get the last frame in the traceback
-                        log_data["file"] = f"{os.path.basename(filename)}:{lineno}"
-                    log_data["stack"] = ''.join(traceback.format_exception(exc_type, exc_value, exc_traceback))
+                elif isinstance(exc_info, BaseException):
+                    exc_info = (type(exc_info), exc_info, exc_info.__traceback__)
+                if isinstance(exc_info, tuple) and len(exc_info) == 3 and exc_info[0] is not None:
+                    tb = exc_info[2]
+                    if tb is not None:
+                        # Get the last frame in the traceback
+                        while tb.tb_next is not None:
+                            tb = tb.tb_next
+                        log_data["file"] = f"{os.path.basename(tb.tb_frame.f_code.co_filename)}:{tb.tb_lineno}"
+                    log_data["stack"] = _LazyTraceback(exc_info)
                 kwargs['exc_info'] = False
             output_key = "error"
             if kwargs.pop('is_exception', False):
@@ -45,55 +133,81 @@ class JSONAdapter(logging.LoggerAdapter):
             output_key = level_name
             log_data["file"] = self.get_caller_file()
 
-        log_data.update(self.extra)
         if "extra" in kwargs:
             log_data.update(kwargs["extra"])
 
         output = {output_key: log_data, "level": log_data["level"]}
-        return json.dumps(output), kwargs
+        return _LazyJSON(output), kwargs
 
     def get_caller_file(self):
-        current_file = os.path.normcase(os.path.abspath(__file__))
-        for frame_info in traceback.extract_stack():
-            filename, lineno, _, _ = frame_info
-            if os.path.normcase(os.path.abspath(filename)) != current_file:
-                return f"{os.path.basename(filename)}:{lineno}"
-        
+        # walk up to the first frame outside this module
         frame = sys._getframe(1)
+        while frame.f_back is not None and frame.f_code.co_filename == _THIS_FILE:
+            frame = frame.f_back
         return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno}"
 
     def log(self, level, msg, *args, **kwargs):
         if self.isEnabledFor(level):
             kwargs['level'] = level
+            # args go into the message before it is serialized, not into the JSON text
+            if args:
+                msg = _format_message(msg, args)
             msg, kwargs = self.process(msg, kwargs)
-            self.logger._log(level, msg, args, **kwargs)
+            self.logger._log(level, msg, (), **kwargs)
+
+    # The level checks below return before any work for filtered levels. The message itself is
+    # still built by the caller, so on hot paths prefer lazy %-style args over pre-formatted f-strings.
 
     def error(self, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(logging.ERROR):
+            return
         if 'exc_info' not in kwargs:
-            kwargs['exc_info'] = sys.exc_info()
+            exc_info = sys.exc_info()
+            # Only attach a traceback when an exception is being handled
+            if exc_info[0] is not None:
+                kwargs['exc_info'] = exc_info
         self.log(logging.ERROR, msg, *args, **kwargs)
 
     def exception(self, msg, *args, **kwargs):
-        kwargs['exc_info'] = True
+        if not self.logger.isEnabledFor(logging.ERROR):
+            return
+        kwargs.setdefault('exc_info', True)
         kwargs['is_exception'] = True
         self.log(logging.ERROR, msg, *args, **kwargs)
 
     def debug(self, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
         self.log(logging.DEBUG, msg, *args, **kwargs)
 
     def info(self, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
         self.log(logging.INFO, msg, *args, **kwargs)
 
     def warning(self, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(logging.WARNING):
+            return
         self.log(logging.WARNING, msg, *args, **kwargs)
 
     def critical(self, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(logging.CRITICAL):
+            return
         self.log(logging.CRITICAL, msg, *args, **kwargs)
 
 
+# one adapter per logger name
+_ADAPTERS: Dict[str, JSONAdapter] = {}
+
+
 def setup_logger(name):
+    adapter = _ADAPTERS.get(name)
+    if adapter is not None:
+        return adapter
+
     logger = logging.getLogger(name)
     
-    logger.debug(f"Init logger {name} with logging level {settings.LOG_LEVEL}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Init logger %s with logging level %s", name, settings.LOG_LEVEL)
     
-    return JSONAdapter(logger)
\ No newline at end of file
+    return _ADAPTERS.setdefault(name, JSONAdapter(logger))
\ No newline at end of file